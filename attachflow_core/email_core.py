@@ -10,35 +10,60 @@ Este módulo é independente do Django. O Django passa configurações simples
 
 from __future__ import annotations
 
+import binascii
 import email
+import io
 import logging
+import os
+import quopri
 import re
+import socket
+import ssl
+import string
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass, field
 from datetime import datetime
+from email.header import decode_header, make_header
 from email.message import Message
+from email.parser import BytesHeaderParser
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, List, Optional, Set, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import unquote
 
-from imapclient import IMAPClient
+from imapclient import IMAPClient, SocketTimeout
+from imapclient.response_types import BodyData
+
+try:
+    # RE2 (opcional): correspondência em tempo linear, sem backtracking
+    import re2
+except ImportError:  # pragma: no cover - depende do ambiente
+    re2 = None
+
+from .imap_pool import get_client, release_client
 
 
 # ------------------------------------------------------------------------------
-# Logging básico
+# Logging (a configuração dos handlers fica em logging_config.setup_logging)
 # ------------------------------------------------------------------------------
 
 log = logging.getLogger(__name__)
-if not log.handlers:
-    # Configuração simples; em produção o Django pode sobrepor isto
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    )
 
 
 # ------------------------------------------------------------------------------
 # Dataclasses de configuração e resultados
 # ------------------------------------------------------------------------------
 
+DEFAULT_FILENAME_TEMPLATE = "{date:%Y.%m.%d %H.%M} - {rule_name}{index}{ext}"
+
+# Placeholders aceites em filename_template
+TEMPLATE_FIELDS = frozenset(
+    {"date", "rule_name", "account_name", "original_name", "index", "ext"}
+)
+
+
 @dataclass
 class EmailAccountConfig:
     host: str
@@ -57,14 +82,83 @@ class RuleConfig:
     imap_folder: str = "INBOX"
     from_contains: str = ""
     subject_contains: str = ""
+    body_contains: str = ""
     filename_regex: str = ""
     dest_folder: str = ""
     mark_as_read: bool = True
     move_to_folder: str = ""
-    filename_template: str = "{date:%Y.%m.%d %H.%M} - {rule_name}{index}{ext}"
+    filename_template: str = DEFAULT_FILENAME_TEMPLATE
+
+    # Pesquisa incremental: UIDs até last_uid (inclusive) já foram analisados
+    # numa execução anterior, com a pasta neste UIDVALIDITY. Os processed_uids
+    # passados a run_rule também só valem neste UIDVALIDITY.
+    last_uid: Optional[int] = None
+    uid_validity: Optional[int] = None
+
+    # filename_regex compilado (ver compile_filename_regex); pode ser passado
+    # já compilado (ex.: Rule.compiled_filename_regex), senão compila-se aqui
+    filename_match: Optional[Callable[[str], Any]] = field(
+        default=None, repr=False, compare=False
+    )
 
+    def __post_init__(self):
+        # falha cedo (ValueError) se o padrão for inválido ou perigoso
+        if self.filename_regex and self.filename_match is None:
+            self.filename_match = compile_filename_regex(self.filename_regex)
 
-@dataclass
+
+# Conversões aceites nos placeholders, como em str.format
+_TEMPLATE_CONVERSIONS = {"r": repr, "s": str, "a": ascii}
+
+
+@dataclass(frozen=True)
+class CompiledTemplate:
+    """
+    filename_template já analisado numa sequência de
+    (texto_literal, placeholder_ou_None, formato, conversão).
+
+    Construído uma vez por template: para cada anexo basta juntar as
+    partes, sem voltar a interpretar o template.
+    """
+    source: str
+    tokens: Tuple[Tuple[str, Optional[str], str, Optional[str]], ...]
+
+    @classmethod
+    @lru_cache(maxsize=128)
+    def compile(cls, template: str) -> "CompiledTemplate":
+        """
+        Analisa o template; placeholders ou conversões (!r, !s, !a)
+        desconhecidos dão ValueError.
+        O resultado (imutável) fica em cache por template, partilhado entre
+        execuções e threads.
+        """
+        tokens = []
+        for literal, field_name, spec, conversion in string.Formatter().parse(template):
+            if field_name is not None and field_name not in TEMPLATE_FIELDS:
+                raise ValueError(f"Placeholder desconhecido no template: {{{field_name}}}")
+            if conversion is not None and conversion not in _TEMPLATE_CONVERSIONS:
+                raise ValueError(f"Conversão desconhecida no template: !{conversion}")
+            tokens.append((literal, field_name, spec or "", conversion))
+        return cls(template, tuple(tokens))
+
+    def render(self, dt: datetime, values: Dict[str, str]) -> str:
+        """
+        Preenche o template como str.format: {date:FMT} via strftime
+        (datetime.__format__), restantes por valor, com !r/!s/!a aplicados.
+        """
+        out = []
+        for literal, name, spec, conversion in self.tokens:
+            out.append(literal)
+            if name is None:
+                continue
+            value = dt if name == "date" else values[name]
+            if conversion is not None:
+                value = _TEMPLATE_CONVERSIONS[conversion](value)
+            out.append(format(value, spec))
+        return "".join(out)
+
+
+@dataclass(slots=True)
 class AttachmentDownload:
     rule_name: str
     account_name: str
@@ -74,6 +168,24 @@ class AttachmentDownload:
     original_filename: str
     final_path: Path
     size_bytes: int
+    sender: str = ""
+    subject: str = ""
+
+
+@dataclass(slots=True)
+class AttachmentPart:
+    """
+    Parte de uma mensagem identificada como anexo a partir do BODYSTRUCTURE,
+    antes de qualquer byte do conteúdo ser descarregado.
+    """
+    part_number: str
+    filename: str
+    encoding: str
+    # tamanho ainda codificado (octetos), tal como indicado pelo servidor
+    encoded_size: int
+    # Conteúdo (ainda com o Content-Transfer-Encoding) já disponível
+    # localmente; só preenchido no recurso ao RFC822 completo
+    payload: Optional[bytes] = None
 
 
 @dataclass
@@ -83,6 +195,14 @@ class RunStats:
     errors: List[str] = field(default_factory=list)
     downloaded_attachments: List[AttachmentDownload] = field(default_factory=list)
     processed_uids: Set[str] = field(default_factory=set)
+    # novo ponto de partida da pesquisa incremental (ver RuleConfig.last_uid);
+    # None se a execução teve erros: a regra mantém o ponto de partida anterior
+    last_uid: Optional[int] = None
+    # UIDVALIDITY da pasta nesta execução (None se não chegou ao SELECT)
+    uid_validity: Optional[int] = None
+    # o UIDVALIDITY mudou desde a execução anterior: o servidor renumerou as
+    # mensagens e os UIDs processados guardados deixaram de as identificar
+    uid_validity_reset: bool = False
 
 
 @dataclass
@@ -96,13 +216,69 @@ class TestConnectionResult:
 # Funções utilitárias
 # ------------------------------------------------------------------------------
 
+# Caracteres proibidos em nomes de ficheiros (Windows/Linux) -> "_"
+_BAD_CHARS_MAP = str.maketrans({c: "_" for c in '\\/*?:"<>|'})
+
+
+# Última sessão TLS por servidor, para retomar (resumption) na ligação seguinte
+_tls_sessions: Dict[str, ssl.SSLSession] = {}
+
+
+class _ResumingSSLContext(ssl.SSLContext):
+    """
+    SSLContext partilhado que oferece ao servidor a última sessão TLS
+    conhecida para o mesmo host, poupando parte do handshake ao voltar
+    a ligar (botão "Testar ligação", execuções via cron, reconexões do pool).
+    """
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if session is None and server_hostname:
+            session = _tls_sessions.get(server_hostname)
+        return super().wrap_socket(
+            sock, *args, server_hostname=server_hostname, session=session, **kwargs
+        )
+
+
+def _create_ssl_context() -> ssl.SSLContext:
+    ctx = _ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    return ctx
+
+
+_SSL_CTX = _create_ssl_context()
+
+# Limites (segundos) para não ficar pendurado num servidor que deixou de
+# responder: ligação/handshake e cada leitura do socket
+IMAP_CONNECT_TIMEOUT = 10
+IMAP_READ_TIMEOUT = 60
+
+
 def _connect_imap(cfg: EmailAccountConfig) -> IMAPClient:
     """
     Cria e devolve um cliente IMAP ligado e autenticado.
     """
     log.debug("A ligar ao IMAP %s:%s (SSL=%s)", cfg.host, cfg.port, cfg.use_ssl)
-    client = IMAPClient(cfg.host, port=cfg.port, ssl=cfg.use_ssl)
+    client = IMAPClient(
+        cfg.host,
+        port=cfg.port,
+        ssl=cfg.use_ssl,
+        ssl_context=_SSL_CTX,
+        timeout=SocketTimeout(connect=IMAP_CONNECT_TIMEOUT, read=IMAP_READ_TIMEOUT),
+    )
     client.login(cfg.username, cfg.password)
+
+    sock = client.socket()
+    try:
+        # ligações guardadas no pool não devem morrer em silêncio em NATs/firewalls
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    except OSError:
+        pass
+
+    # em TLS 1.3 o ticket da sessão só chega depois do handshake: guardar após o login
+    session = getattr(sock, "session", None)
+    if session is not None:
+        _tls_sessions[cfg.host] = session
+
     return client
 
 
@@ -128,94 +304,222 @@ def _get_message_id(msg: Message) -> str:
     return msg.get("Message-ID", "")
 
 
-def _format_date_in_template(template_str: str, dt: datetime) -> str:
+# ".*" / ".+" não escapados
+_UNBOUNDED_WILDCARD_RE = re.compile(r"(?<!\\)\.[*+]")
+# "|" não escapado (separa alternativas)
+_ALTERNATION_RE = re.compile(r"(?<!\\)\|")
+
+
+def compile_filename_regex(pattern: str) -> Callable[[str], Any]:
     """
-    Substitui ocorrências de {date:%Y-%m-%d ...} pelo strftime correspondente.
+    Compila filename_regex e devolve a função de correspondência.
+
+    - o padrão tem de corresponder ao nome COMPLETO do anexo (fullmatch,
+      equivalente a \\A(?:padrão)\\Z), o que evita tentar o padrão a partir
+      de cada posição do nome;
+    - padrões com mais de um ".*"/".+" na mesma alternativa são recusados
+      (backtracking explosivo em nomes que não correspondem);
+    - usa RE2 (tempo linear) quando instalado, senão o módulo re.
+
+    Levanta ValueError se o padrão for inválido ou recusado.
     """
-    def repl(match):
-        fmt = match.group(1)
-        return dt.strftime(fmt)
+    for branch in _ALTERNATION_RE.split(pattern):
+        if len(_UNBOUNDED_WILDCARD_RE.findall(branch)) > 1:
+            raise ValueError(
+                f"Padrão '{pattern}' tem mais de um '.*'/'.+' na mesma alternativa; "
+                "limite os restantes (ex.: '.{0,80}?')."
+            )
+
+    if re2 is not None:
+        try:
+            return re2.compile(pattern).fullmatch
+        except Exception:
+            # sintaxe não suportada pelo RE2 (ex.: backreferences): usar re
+            pass
 
-    return re.sub(r"{date:([^}]+)}", repl, template_str)
+    try:
+        return re.compile(pattern).fullmatch
+    except re.error as e:
+        raise ValueError(f"Expressão regular inválida '{pattern}': {e}") from e
 
 
 def _sanitize_filename(name: str) -> str:
     """
     Remove caracteres proibidos para ficheiros em Windows/Linux.
     """
-    return re.sub(r'[\\/*?:"<>|]', "_", name)
+    return name.translate(_BAD_CHARS_MAP)
 
 
 def build_download_filename(
-    msg: Message,
+    msg: Optional[Message],
     attachment_name: str,
     rule: RuleConfig,
     index: int,
     dest_folder: Path,
+    msg_date: Optional[datetime] = None,
+    existing: Optional[Set[str]] = None,
+    template: Optional[CompiledTemplate] = None,
 ) -> Path:
     """
     Gera o nome final do ficheiro, garantindo:
     - {index} vem antes de {ext}
-    - unicidade dentro da pasta de destino
+    - unicidade face aos nomes em existing (se indicado)
     - template por defeito:
       {date:%Y.%m.%d %H.%M} - {rule_name}{index}{ext}
 
     index:
       - 1  -> não acrescenta nada (ficheiro "limpo")
       - >1 -> acrescenta "_2", "_3", etc., conforme template
+
+    msg_date:
+      data já conhecida da mensagem (ex.: ENVELOPE/INTERNALDATE). Se não for
+      indicada, é lida do cabeçalho 'Date' de msg.
+
+    existing:
+      nomes já presentes em dest_folder (ex.: set(os.listdir(dest_folder))).
+      A verificação de conflitos é feita neste conjunto, sem stat() por
+      candidato; o nome escolhido é acrescentado ao conjunto.
+      A unicidade no disco só é garantida ao criar o ficheiro
+      (_open_exclusive), que acrescenta _2, _3, ... se o nome já existir.
+
+    template:
+      rule.filename_template já compilado (CompiledTemplate.compile); evita
+      voltar a analisar o template em cada anexo.
     """
-    msg_date = _get_message_datetime(msg) or datetime.now()
+    if msg_date is None and msg is not None:
+        msg_date = _get_message_datetime(msg)
+    msg_date = msg_date or datetime.now()
 
     original = Path(attachment_name)
     ext = original.suffix or ""
     original_stem = original.stem
 
-    template = rule.filename_template or "{date:%Y.%m.%d %H.%M} - {rule_name}{index}{ext}"
-
-    # 1) aplicar {date:...}
-    filled = _format_date_in_template(template, msg_date)
+    if template is None:
+        template = CompiledTemplate.compile(rule.filename_template or DEFAULT_FILENAME_TEMPLATE)
 
-    # 2) aplicar os restantes placeholders
+    # 1) aplicar placeholders ({date:...} via strftime)
     # index: para o primeiro anexo não queremos "_1" por defeito
     index_placeholder = f"_{index}" if index > 1 else ""
 
-    filled = filled.format(
-        rule_name=rule.name,
-        account_name=rule.account.name or rule.account.username,
-        original_name=original_stem,
-        index=index_placeholder,
-        ext=ext,
+    filled = template.render(
+        msg_date,
+        {
+            "rule_name": rule.name,
+            "account_name": rule.account.name or rule.account.username,
+            "original_name": original_stem,
+            "index": index_placeholder,
+            "ext": ext,
+        },
     )
 
     safe_name = _sanitize_filename(filled)
-    final_path = dest_folder / safe_name
 
-    # 3) fallback se já existir: acrescentar sufixo _2, _3, ...
-    counter = 2
-    while final_path.exists():
-        base = safe_name[:-len(ext)] if ext else safe_name
-        candidate = f"{base}_{counter}{ext}"
-        final_path = dest_folder / candidate
-        counter += 1
+    # 2) fallback se já existir: acrescentar sufixo _2, _3, ...
+    candidate = safe_name
+    if existing is not None:
+        counter = 2
+        while candidate in existing:
+            base = safe_name[:-len(ext)] if ext else safe_name
+            candidate = f"{base}_{counter}{ext}"
+            counter += 1
+        existing.add(candidate)
+
+    return dest_folder / candidate
+
+
+_EXCL_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+
 
-    return final_path
+def _open_exclusive(path: Path) -> Tuple[int, Path]:
+    """
+    Cria o ficheiro de forma atómica (O_EXCL): se o nome já existir, tenta
+    path com sufixo _2, _3, ... Evita a janela entre verificar se existe e
+    abrir, em que duas execuções em paralelo podiam escrever no mesmo ficheiro.
+    Devolve (descritor, caminho efectivamente criado).
+    """
+    ext = path.suffix
+    base = path.name[:-len(ext)] if ext else path.name
+    candidate = path
+    counter = 2
+    while True:
+        try:
+            return os.open(candidate, _EXCL_FLAGS, 0o644), candidate
+        except FileExistsError:
+            candidate = path.with_name(f"{base}_{counter}{ext}")
+            counter += 1
 
 
 # ------------------------------------------------------------------------------
 # Teste de ligação e listagem de pastas
 # ------------------------------------------------------------------------------
 
-def test_imap_connection(cfg: EmailAccountConfig) -> TestConnectionResult:
+# Listagens de pastas mudam raramente: guardamos o resultado durante alguns
+# minutos por conta, para selectores/dropdowns não irem sempre ao servidor.
+FOLDER_CACHE_TTL = 300
+
+_FolderKey = Tuple[str, int, str, bool]
+_folder_cache: Dict[_FolderKey, Tuple[float, List[str]]] = {}
+# listagens em curso: quem chega depois espera pelo resultado em vez de
+# abrir mais pedidos LIST em paralelo para a mesma conta
+_folder_pending: Dict[_FolderKey, threading.Event] = {}
+_folder_lock = threading.Lock()
+
+
+def _folder_key(cfg: EmailAccountConfig, include_unsubscribed: bool) -> _FolderKey:
+    return (cfg.host, cfg.port, cfg.username, include_unsubscribed)
+
+
+def _store_folders(
+    cfg: EmailAccountConfig,
+    folders: List[str],
+    include_unsubscribed: bool,
+) -> None:
+    with _folder_lock:
+        _folder_cache[_folder_key(cfg, include_unsubscribed)] = (
+            time.monotonic(),
+            list(folders),
+        )
+
+
+def _fetch_folder_names(cfg: EmailAccountConfig, include_unsubscribed: bool) -> List[str]:
+    """
+    Pede a lista de pastas ao servidor (sem cache).
+
+    Por defeito só as pastas subscritas (LSUB): em contas com milhares de
+    pastas a resposta do LIST completo domina o tempo da listagem. Se a conta
+    não tiver subscrições usa-se o LIST completo.
+    """
+    client = get_client(cfg)
+    try:
+        folders_info = [] if include_unsubscribed else client.list_sub_folders()
+        if not folders_info:
+            folders_info = client.list_folders()
+    except Exception:
+        release_client(cfg, client, discard=True)
+        raise
+    release_client(cfg, client)
+    # folders_info: [(flags, delimiter, name), ...]
+    folders = [f[2] for f in folders_info]
+
+    # vários servidores não incluem a INBOX no LSUB, mas existe sempre
+    if not any(name.upper() == "INBOX" for name in folders):
+        folders.insert(0, "INBOX")
+    return folders
+
+
+def test_imap_connection(
+    cfg: EmailAccountConfig,
+    include_unsubscribed: bool = False,
+) -> TestConnectionResult:
     """
     Tenta ligar ao servidor IMAP, autenticar e listar pastas.
-    Devolve sucesso/erro + lista de pastas (caso sucesso).
+    Devolve sucesso/erro + lista de pastas (caso sucesso); por defeito só
+    as subscritas (ver list_imap_folders).
     """
     try:
-        client = _connect_imap(cfg)
-        folders_info = client.list_folders()
-        # folders_info: [(flags, delimiter, name), ...]
-        folders = [f[2] for f in folders_info]
-        client.logout()
+        # acção explícita do utilizador: vai sempre ao servidor
+        folders = _fetch_folder_names(cfg, include_unsubscribed)
+        _store_folders(cfg, folders, include_unsubscribed)
         return TestConnectionResult(
             success=True,
             message="Ligação bem sucedida.",
@@ -230,14 +534,46 @@ def test_imap_connection(cfg: EmailAccountConfig) -> TestConnectionResult:
         )
 
 
-def list_imap_folders(cfg: EmailAccountConfig) -> List[str]:
+def list_imap_folders(
+    cfg: EmailAccountConfig,
+    use_cache: bool = True,
+    include_unsubscribed: bool = False,
+) -> List[str]:
     """
     Apenas lista as pastas IMAP. Assumimos que a ligação é válida.
+
+    Por defeito devolve só as pastas subscritas (LSUB), que são as que
+    interessam nos selectores; include_unsubscribed=True lista todas.
+
+    Com use_cache=True devolve a última listagem se tiver menos de
+    FOLDER_CACHE_TTL segundos. Pedidos simultâneos para a mesma conta
+    partilham uma única ida ao servidor.
     """
-    client = _connect_imap(cfg)
-    folders_info = client.list_folders()
-    folders = [f[2] for f in folders_info]
-    client.logout()
+    key = _folder_key(cfg, include_unsubscribed)
+
+    while True:
+        with _folder_lock:
+            cached = _folder_cache.get(key)
+            if use_cache and cached and time.monotonic() - cached[0] < FOLDER_CACHE_TTL:
+                return list(cached[1])
+
+            pending = _folder_pending.get(key)
+            if pending is None:
+                pending = _folder_pending[key] = threading.Event()
+                break
+
+        # outra thread já está a listar esta conta: esperar e voltar a ver a cache
+        pending.wait()
+        use_cache = True
+
+    try:
+        folders = _fetch_folder_names(cfg, include_unsubscribed)
+        _store_folders(cfg, folders, include_unsubscribed)
+    finally:
+        with _folder_lock:
+            del _folder_pending[key]
+        pending.set()
+
     return folders
 
 
@@ -245,12 +581,59 @@ def list_imap_folders(cfg: EmailAccountConfig) -> List[str]:
 # Execução de regras (run_rule)
 # ------------------------------------------------------------------------------
 
-def _build_search_criteria(rule: RuleConfig) -> List:
+# Máximo de UIDs por comando STORE/MOVE (ver _run_batched)
+_UID_SET_CHUNK = 500
+
+# Máximo de intervalos de UIDs enviados no "NOT UID" do SEARCH. Vai tudo
+# numa só linha de comando, e vários servidores recusam linhas longas
+# (Dovecot: 64 KB por defeito); ~1000 intervalos ficam bem abaixo disso.
+_MAX_NOT_UID_RANGES = 1000
+
+
+def _uid_ranges(uids: Iterable[str]) -> List[str]:
+    """
+    Compacta UIDs em intervalos IMAP: {1, 2, 3, 7} -> ["1:3", "7"].
+    """
+    numbers = sorted({int(u) for u in uids if str(u).isdigit()})
+    ranges: List[str] = []
+    i = 0
+    while i < len(numbers):
+        start = end = numbers[i]
+        while i + 1 < len(numbers) and numbers[i + 1] == end + 1:
+            i += 1
+            end = numbers[i]
+        ranges.append(str(start) if start == end else f"{start}:{end}")
+        i += 1
+    return ranges
+
+
+def _build_search_criteria(
+    rule: RuleConfig,
+    processed_uids: Optional[Set[str]] = None,
+    min_uid: Optional[int] = None,
+) -> List:
     """
     Constrói a lista de critérios IMAP para o IMAPClient.
-    Só usamos filtros simples (FROM / SUBJECT); datas podem ser adicionadas depois.
+    Só usamos filtros simples (FROM / SUBJECT / BODY); datas podem ser
+    adicionadas depois. Toda a filtragem de texto é feita pelo servidor.
+
+    min_uid:
+      pesquisa incremental: só mensagens com UID >= min_uid (UID min_uid:*).
+      Os UIDs processados abaixo disso já ficam de fora e não vão no NOT UID.
+
+    Os UIDs já processados são excluídos no próprio SEARCH (NOT UID ...),
+    para o servidor nem sequer os devolver. Só seguem os
+    _MAX_NOT_UID_RANGES intervalos mais recentes; os UIDs mais antigos que o
+    servidor ainda devolva são descartados em Python (run_rule).
     """
-    criteria: List = ["ALL"]
+    criteria: List = []
+
+    if min_uid is not None:
+        criteria += ["UID", f"{min_uid}:*"]
+        if processed_uids:
+            processed_uids = {
+                u for u in processed_uids if str(u).isdigit() and int(u) >= min_uid
+            }
 
     if rule.from_contains:
         criteria += ["FROM", rule.from_contains]
@@ -258,13 +641,24 @@ def _build_search_criteria(rule: RuleConfig) -> List:
     if rule.subject_contains:
         criteria += ["SUBJECT", rule.subject_contains]
 
-    return criteria
+    if rule.body_contains:
+        criteria += ["BODY", rule.body_contains]
+
+    if processed_uids:
+        ranges = _uid_ranges(processed_uids)
+        if ranges:
+            criteria += ["NOT", "UID", ",".join(ranges[-_MAX_NOT_UID_RANGES:])]
+
+    # ALL só é necessário quando não há nenhum outro critério
+    return criteria or ["ALL"]
 
 
-def _iter_attachments(msg: Message) -> Iterable[Tuple[str, bytes]]:
+def _iter_attachments(msg: Message) -> Iterable[Tuple[str, str, bytes]]:
     """
     Itera sobre as partes da mensagem que são anexos.
-    Devolve tuplos (filename, payload_bytes).
+    Devolve tuplos (filename, content_transfer_encoding, payload_codificado).
+    A descodificação fica para a escrita em disco (_write_part_payload),
+    para não manter em memória uma cópia descodificada de cada anexo.
     """
     for part in msg.walk():
         content_disposition = part.get_content_disposition()
@@ -275,8 +669,439 @@ def _iter_attachments(msg: Message) -> Iterable[Tuple[str, bytes]]:
         if not filename:
             continue
 
-        payload = part.get_payload(decode=True) or b""
-        yield filename, payload
+        payload = part.get_payload()
+        if isinstance(payload, list):
+            # ex.: message/rfc822 anexado
+            raw = b"".join(sub.as_bytes() for sub in payload)
+            yield filename, "", raw
+            continue
+
+        # o parser guarda bytes não-ASCII como surrogates; isto recupera os originais
+        try:
+            raw = payload.encode("ascii", "surrogateescape")
+        except UnicodeEncodeError:
+            raw = payload.encode("utf-8")
+        yield filename, part.get("Content-Transfer-Encoding", "").strip().lower(), raw
+
+
+# Número máximo de UIDs por FETCH de estrutura (evita comandos IMAP gigantes)
+_FETCH_BATCH_SIZE = 200
+
+# Só os cabeçalhos necessários para nomes de ficheiros e registos
+_HEADER_FIELDS = "DATE MESSAGE-ID SUBJECT FROM"
+_FETCH_ITEMS = [
+    "BODYSTRUCTURE",
+    "INTERNALDATE",
+    f"BODY.PEEK[HEADER.FIELDS ({_HEADER_FIELDS})]",
+]
+
+_header_parser = BytesHeaderParser()
+
+
+def _to_str(value) -> str:
+    """
+    Converte valores devolvidos pelo IMAPClient (normalmente bytes) em str.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _find_fetch_item(data: dict, prefix: bytes):
+    """
+    Procura um item da resposta FETCH pelo início da chave: os servidores
+    não devolvem todos a secção HEADER.FIELDS formatada da mesma maneira.
+    """
+    for key, value in data.items():
+        if isinstance(key, bytes) and key.upper().startswith(prefix):
+            return value
+    return None
+
+
+def _decode_header_value(value) -> str:
+    """
+    Descodifica encoded-words RFC 2047 (ex.: =?utf-8?q?Fatura?=).
+    """
+    text = _to_str(value)
+    try:
+        return str(make_header(decode_header(text)))
+    except Exception:
+        return text
+
+
+def _get_structure_param(params, name: str) -> str:
+    """
+    Lê um parâmetro (ex.: filename, name) de uma lista do BODYSTRUCTURE
+    (chave, valor, chave, valor, ...). Suporta também a forma RFC 2231
+    (name*=charset'lang'valor, possivelmente partida em name*0*, name*1*, ...).
+    """
+    if not isinstance(params, (tuple, list)):
+        return ""
+
+    values = {}
+    it = iter(params)
+    for key, value in zip(it, it):
+        values[_to_str(key).lower()] = _to_str(value)
+
+    if name in values:
+        return _decode_header_value(values[name])
+
+    pieces = []
+    encoded = f"{name}*" in values
+    if encoded:
+        pieces.append(values[f"{name}*"])
+    else:
+        i = 0
+        while True:
+            if f"{name}*{i}*" in values:
+                encoded = encoded or i == 0
+                pieces.append(values[f"{name}*{i}*"])
+            elif f"{name}*{i}" in values:
+                pieces.append(values[f"{name}*{i}"])
+            else:
+                break
+            i += 1
+
+    raw = "".join(pieces)
+    if not encoded or raw.count("'") < 2:
+        return raw
+
+    charset, _, rest = raw.partition("'")
+    _lang, _, text = rest.partition("'")
+    try:
+        return unquote(text, encoding=charset or "utf-8", errors="replace")
+    except LookupError:
+        return unquote(text, errors="replace")
+
+
+def _structure_disposition(body) -> Tuple[str, tuple]:
+    """
+    Devolve (tipo, parâmetros) do Content-Disposition de uma parte não-multipart.
+    A posição dos campos de extensão depende do tipo MIME (RFC 3501, 7.4.2).
+    """
+    media_type = _to_str(body[0]).lower()
+    subtype = _to_str(body[1]).lower()
+    if media_type == "text":
+        ext = 8
+    elif media_type == "message" and subtype == "rfc822":
+        ext = 10
+    else:
+        ext = 7
+
+    # ext -> MD5, ext + 1 -> disposition
+    if len(body) <= ext + 1:
+        return "", ()
+    disposition = body[ext + 1]
+    if not isinstance(disposition, (tuple, list)) or not disposition:
+        return "", ()
+    params = disposition[1] if len(disposition) > 1 else ()
+    return _to_str(disposition[0]).lower(), params
+
+
+def _iter_attachment_parts(body, part_number: str = "") -> Iterable[AttachmentPart]:
+    """
+    Percorre recursivamente o BODYSTRUCTURE e devolve as partes marcadas como
+    anexo, com o respectivo número de parte IMAP (ex.: "2", "1.3").
+    Mensagens anexadas (message/rfc822, ex.: um .eml reencaminhado) também
+    são percorridas, como fazia msg.walk(): os anexos lá dentro têm números
+    "n.1", "n.2", ...
+    Nenhum conteúdo é descarregado nesta fase.
+    """
+    if isinstance(body[0], list):
+        for i, child in enumerate(body[0], start=1):
+            child_number = f"{part_number}.{i}" if part_number else str(i)
+            yield from _iter_attachment_parts(child, child_number)
+        return
+
+    number = part_number or "1"
+
+    disposition, disposition_params = _structure_disposition(body)
+    if disposition == "attachment":
+        filename = (
+            _get_structure_param(disposition_params, "filename")
+            or _get_structure_param(body[2], "name")
+        )
+        if filename:
+            yield AttachmentPart(
+                part_number=number,
+                filename=filename,
+                encoding=_to_str(body[5]).lower(),
+                encoded_size=int(body[6] or 0),
+            )
+
+    # message/rfc822: campo 8 é o BODYSTRUCTURE da mensagem interior
+    is_message = (
+        _to_str(body[0]).lower() == "message"
+        and _to_str(body[1]).lower() == "rfc822"
+    )
+    if is_message and len(body) > 8 and isinstance(body[8], tuple):
+        inner = body[8] if isinstance(body[8], BodyData) else BodyData.create(body[8])
+        # multipart: as partes são n.1, n.2, ...; parte única: n.1
+        inner_number = number if isinstance(inner[0], list) else f"{number}.1"
+        yield from _iter_attachment_parts(inner, inner_number)
+
+
+# Tamanho dos blocos de base64 descodificados de cada vez
+_DECODE_CHUNK = 1 << 20
+# Tudo o que não é do alfabeto base64 (nem "=") é ignorado, como no email
+_BASE64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+_BASE64_IGNORED = bytes(sorted(set(range(256)) - set(_BASE64_ALPHABET)))
+
+
+class CountingWriter(io.RawIOBase):
+    """
+    Envolve um ficheiro binário e conta os bytes escritos, para obter o
+    tamanho final do anexo sem precisar do conteúdo descodificado em memória.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        n = self._raw.write(b)
+        if n is None:
+            n = len(b)
+        self.bytes_written += n
+        return n
+
+
+def _copy_base64(data: bytes, dst) -> None:
+    """
+    Descodifica base64 por blocos directamente para dst.
+    Tolera o que os clientes de email reais enviam: caracteres fora do
+    alfabeto (ignorados) e o último bloco sem "=" de padding.
+    """
+    carry = b""
+    for start in range(0, len(data), _DECODE_CHUNK):
+        block = carry + data[start:start + _DECODE_CHUNK].translate(None, _BASE64_IGNORED)
+        usable = len(block) - len(block) % 4
+        dst.write(binascii.a2b_base64(block[:usable]))
+        carry = block[usable:]
+
+    carry = carry.rstrip(b"=")
+    if len(carry) % 4 == 1:
+        # um único carácter solto não representa nenhum byte
+        carry = carry[:-1]
+    if carry:
+        dst.write(binascii.a2b_base64(carry + b"=" * (-len(carry) % 4)))
+
+
+def _write_part_payload(data: bytes, encoding: str, path: Path) -> Tuple[Path, int]:
+    """
+    Descodifica o conteúdo de uma parte segundo o Content-Transfer-Encoding
+    e grava-o num ficheiro novo (path, ou path com sufixo se já existir)
+    à medida que é descodificado.
+    Devolve (caminho gravado, bytes escritos contados por CountingWriter).
+    """
+    fd, path = _open_exclusive(path)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            out = CountingWriter(f)
+            if encoding == "base64":
+                _copy_base64(data, out)
+            elif encoding == "quoted-printable":
+                quopri.decode(io.BytesIO(data), out)
+            else:
+                out.write(data)
+    except BaseException:
+        # não deixar um ficheiro incompleto na pasta de destino
+        path.unlink(missing_ok=True)
+        raise
+    return path, out.bytes_written
+
+
+def _fetch_attachment_part(client: IMAPClient, uid: int, part: AttachmentPart) -> bytes:
+    """
+    Descarrega apenas a parte indicada (BODY.PEEK não altera a flag \\Seen).
+    O conteúdo é devolvido ainda codificado (base64, quoted-printable, ...).
+    """
+    response = client.fetch([uid], [f"BODY.PEEK[{part.part_number}]"])
+    data = response.get(uid, {}).get(f"BODY[{part.part_number}]".encode())
+    if data is None:
+        raise ValueError(f"parte {part.part_number} não devolvida pelo servidor")
+    return data
+
+
+# Máximo de conteúdo (codificado, segundo o BODYSTRUCTURE) pedido num só FETCH
+_PART_FETCH_MAX_BYTES = 16 * 1024 * 1024
+
+# (uid, parte, dados extra do chamador)
+_PartJob = Tuple[int, AttachmentPart, Any]
+
+
+def _fetch_parts(
+    client: IMAPClient,
+    jobs: List[_PartJob],
+) -> Iterable[Tuple[_PartJob, Optional[bytes], Optional[Exception]]]:
+    """
+    Descarrega o conteúdo (ainda codificado) das partes indicadas com o menor
+    número de FETCH: a mesma parte (ex.: "2") de vários UIDs vai num único
+    pedido, até _PART_FETCH_MAX_BYTES por pedido. Em vez de uma ida e volta
+    ao servidor por anexo, passa a haver uma por grupo.
+
+    Devolve (job, dados, erro) para cada job; partes que já trazem o
+    conteúdo (recurso RFC822) são devolvidas sem ir ao servidor.
+    """
+    by_number: Dict[str, List[_PartJob]] = {}
+    for job in jobs:
+        part = job[1]
+        if part.payload is not None:
+            yield job, part.payload, None
+        else:
+            by_number.setdefault(part.part_number, []).append(job)
+
+    for number, group in by_number.items():
+        start = 0
+        while start < len(group):
+            end = start + 1
+            size = group[start][1].encoded_size
+            while end < len(group) and size + group[end][1].encoded_size <= _PART_FETCH_MAX_BYTES:
+                size += group[end][1].encoded_size
+                end += 1
+            yield from _fetch_part_chunk(client, number, group[start:end])
+            start = end
+
+
+def _fetch_part_chunk(
+    client: IMAPClient,
+    number: str,
+    chunk: List[_PartJob],
+) -> Iterable[Tuple[_PartJob, Optional[bytes], Optional[Exception]]]:
+    """
+    Um FETCH BODY.PEEK[number] para todos os UIDs de chunk. Se o pedido em
+    lote falhar, repete parte a parte para saber exactamente quais falharam.
+    """
+    try:
+        response = client.fetch([job[0] for job in chunk], [f"BODY.PEEK[{number}]"])
+    except Exception as e:
+        if len(chunk) == 1:
+            yield chunk[0], None, e
+            return
+        log.warning(
+            "Falha ao buscar a parte %s de %d emails em lote (%s); a tentar um a um.",
+            number,
+            len(chunk),
+            e,
+        )
+        for job in chunk:
+            try:
+                data, error = _fetch_attachment_part(client, job[0], job[1]), None
+            except Exception as e:
+                data, error = None, e
+            yield job, data, error
+        return
+
+    key = f"BODY[{number}]".encode()
+    for job in chunk:
+        data = response.get(job[0], {}).get(key)
+        if data is None:
+            yield job, None, ValueError(f"parte {number} não devolvida pelo servidor")
+        else:
+            yield job, data, None
+
+
+# Cabeçalho "Content-Disposition: attachment" em qualquer parte (com folding)
+_ATTACHMENT_DISPOSITION_RE = re.compile(
+    rb'^content-disposition:\s*"?attachment\b',
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def _fetch_rfc822_attachments(client: IMAPClient, uid: int) -> List[AttachmentPart]:
+    """
+    Recurso para mensagens cujo BODYSTRUCTURE não conseguimos interpretar:
+    descarrega a mensagem completa e extrai os anexos com o parser de email.
+    """
+    raw_msg = client.fetch([uid], ["RFC822"])[uid][b"RFC822"]
+
+    # pesquisa nos bytes antes do parse completo: sem nenhuma parte marcada
+    # como anexo não vale a pena construir a árvore MIME
+    if not _ATTACHMENT_DISPOSITION_RE.search(raw_msg):
+        return []
+
+    msg = email.message_from_bytes(raw_msg)
+    return [
+        AttachmentPart(
+            part_number="",
+            filename=filename,
+            encoding=encoding,
+            encoded_size=len(payload),
+            payload=payload,
+        )
+        for filename, encoding, payload in _iter_attachments(msg)
+    ]
+
+
+# Escrita de anexos em threads, em paralelo com os FETCH seguintes
+_WRITE_WORKERS = 4
+# Máximo de anexos já descarregados à espera de gravação (limita a memória)
+_MAX_PENDING_WRITES = 16
+
+
+def _collect_writes(
+    writes: List[Tuple[Future, AttachmentDownload]],
+    stats: RunStats,
+    failed_uids: Set[str],
+) -> None:
+    """
+    Espera pelas gravações submetidas e regista o resultado em stats
+    (pela ordem de submissão). Os UIDs com alguma gravação falhada são
+    acrescentados a failed_uids.
+    """
+    for future, download in writes:
+        try:
+            download.final_path, download.size_bytes = future.result()
+        except Exception as e:
+            err = f"Erro ao gravar anexo '{download.final_path}': {e}"
+            log.error(err)
+            stats.errors.append(err)
+            failed_uids.add(download.uid)
+            continue
+
+        stats.attachments_downloaded += 1
+        stats.downloaded_attachments.append(download)
+
+
+def _run_batched(command, uids: List[int], action: str, *args) -> None:
+    """
+    Executa command(uids, *args) em lotes. Se um lote falhar, repete-o
+    UID a UID para registar exactamente quais os emails afectados,
+    sem interromper os restantes.
+    """
+    for start in range(0, len(uids), _UID_SET_CHUNK):
+        batch = uids[start:start + _UID_SET_CHUNK]
+        try:
+            command(batch, *args)
+            continue
+        except Exception as e:
+            log.warning(
+                "Falha ao %s %d emails em lote (%s); a tentar um a um.",
+                action,
+                len(batch),
+                e,
+            )
+
+        for uid in batch:
+            try:
+                command([uid], *args)
+            except Exception as e:
+                log.warning("Não foi possível %s o email UID %s: %s", action, uid, e)
+
+
+def _search_charset(criteria: List) -> Optional[str]:
+    """
+    CHARSET a indicar no SEARCH: UTF-8 só quando há termos não-ASCII
+    (ex.: "Faturação"); sem isso vários servidores não encontram nada.
+    """
+    if any(isinstance(c, str) and not c.isascii() for c in criteria):
+        return "UTF-8"
+    return None
 
 
 def run_rule(
@@ -287,13 +1112,15 @@ def run_rule(
     Executa uma regra:
     - liga à conta IMAP associada
     - selecciona a pasta imap_folder
-    - pesquisa mensagens com base em from/subject
+    - pesquisa mensagens com base em from/subject/body
     - descarrega anexos que obedeçam ao filename_regex
     - renomeia ficheiros segundo o filename_template
     - devolve RunStats com info de anexos descarregados e UIDs processados
 
     processed_uids:
-      conjunto de UIDs que já foram marcados como processados (opcional).
+      conjunto de UIDs que já foram marcados como processados (opcional),
+      gravados com a pasta em rule.uid_validity; são ignorados se o
+      UIDVALIDITY actual for outro (RunStats.uid_validity_reset).
       A função devolve os novos UIDs processados em RunStats.processed_uids
       para que o chamador (Django) possa persistir isso.
     """
@@ -303,10 +1130,29 @@ def run_rule(
     stats = RunStats()
 
     dest_folder = Path(rule.dest_folder).expanduser()
-    dest_folder.mkdir(parents=True, exist_ok=True)
+
+    # uma única leitura da pasta em vez de um stat() por nome candidato;
+    # só é preciso criá-la (mkdir) na primeira execução
+    try:
+        existing_names = set(os.listdir(dest_folder))
+    except FileNotFoundError:
+        dest_folder.mkdir(parents=True, exist_ok=True)
+        existing_names = set()
 
     account_cfg = rule.account
 
+    # o filtro de nomes já vem compilado no RuleConfig; o template compila-se
+    # uma vez por execução, não por anexo
+    filename_match = rule.filename_match
+
+    try:
+        template = CompiledTemplate.compile(rule.filename_template or DEFAULT_FILENAME_TEMPLATE)
+    except ValueError as e:
+        msg = f"Template de nome de ficheiro inválido '{rule.filename_template}': {e}"
+        log.error(msg)
+        stats.errors.append(msg)
+        return stats
+
     log.info(
         "A executar regra '%s' na conta '%s', pasta '%s'",
         rule.name,
@@ -315,127 +1161,242 @@ def run_rule(
     )
 
     try:
-        client = _connect_imap(account_cfg)
+        client = get_client(account_cfg)
     except Exception as e:
         msg = f"Erro ao ligar à conta IMAP: {e}"
         log.error(msg)
         stats.errors.append(msg)
         return stats
 
+    # gravação em disco numa pool própria: a ligação IMAP não fica parada
+    # enquanto cada anexo é descodificado e escrito
+    write_pool = ThreadPoolExecutor(max_workers=_WRITE_WORKERS)
+    writes: List[Tuple[Future, AttachmentDownload]] = []
+    in_flight: Set[Future] = set()
+
+    # nível verificado uma vez: evita chamadas a log.debug nos ciclos por UID/anexo
+    debug_on = log.isEnabledFor(logging.DEBUG)
+
+    # só devolvemos a ligação ao pool se a execução chegar ao fim sem erros
+    discard_client = True
     try:
         # seleccionar pasta IMAP
-        client.select_folder(rule.imap_folder, readonly=False)
+        folder_info = client.select_folder(rule.imap_folder, readonly=False)
+        uid_validity = folder_info.get(b"UIDVALIDITY")
+        # UIDs abaixo de UIDNEXT já existiam no SELECT e entram no SEARCH
+        uid_next = folder_info.get(b"UIDNEXT")
+        stats.uid_validity = uid_validity
+
+        # UIDVALIDITY mudou: os UIDs guardados referem-se a outras mensagens
+        if (
+            rule.uid_validity is not None
+            and uid_validity is not None
+            and uid_validity != rule.uid_validity
+        ):
+            log.warning(
+                "UIDVALIDITY da pasta '%s' mudou (%s -> %s) na regra '%s': "
+                "UIDs processados anteriores ignorados.",
+                rule.imap_folder, rule.uid_validity, uid_validity, rule.name,
+            )
+            stats.uid_validity_reset = True
+            processed_uids = set()
+
+        # pesquisa incremental só se os UIDs da pasta continuam válidos
+        min_uid = None
+        if rule.last_uid is not None and uid_validity is not None and uid_validity == rule.uid_validity:
+            min_uid = rule.last_uid + 1
 
         # construir critérios de pesquisa
-        criteria = _build_search_criteria(rule)
+        criteria = _build_search_criteria(rule, processed_uids, min_uid)
         log.debug("Critérios IMAP: %s", criteria)
 
         # search devolve UIDs por defeito no IMAPClient
-        uids = client.search(criteria)
+        uids = client.search(criteria, charset=_search_charset(criteria))
+        if min_uid is not None:
+            # "n:*" inclui sempre a última mensagem da pasta, mesmo com UID < n
+            uids = [uid for uid in uids if uid >= min_uid]
         log.info("Encontrados %d emails para a regra '%s'", len(uids), rule.name)
 
+        pending = []
+        # UIDs com pelo menos um anexo seleccionado / com algum anexo que falhou
+        selected_uids: List[int] = []
+        failed_uids: Set[str] = set()
         for uid in uids:
-            uid_str = str(uid)
-
-            # já processado?
-            if uid_str in processed_uids:
-                log.debug("UID %s já processado, a ignorar.", uid_str)
+            # já processado? (o SEARCH já os exclui; isto é só uma salvaguarda)
+            if str(uid) in processed_uids:
+                if debug_on:
+                    log.debug("UID %s já processado, a ignorar.", uid)
                 continue
+            pending.append(uid)
 
-            # fetch mensagem
+        # Um FETCH por lote de UIDs, só com estrutura e metadados: o conteúdo
+        # dos anexos é pedido depois, parte a parte, apenas se passar o filtro.
+        for start in range(0, len(pending), _FETCH_BATCH_SIZE):
+            batch = pending[start:start + _FETCH_BATCH_SIZE]
             try:
-                fetch_data = client.fetch([uid], ["RFC822"])
+                fetch_data = client.fetch(batch, _FETCH_ITEMS)
             except Exception as e:
-                err = f"Erro ao buscar mensagem UID {uid}: {e}"
+                err = f"Erro ao buscar mensagens UID {batch[0]}..{batch[-1]}: {e}"
                 log.error(err)
                 stats.errors.append(err)
                 continue
 
-            raw_msg = fetch_data[uid][b"RFC822"]
-            msg = email.message_from_bytes(raw_msg)
-
-            stats.emails_processed += 1
+            # anexos a descarregar deste lote: (uid, parte, AttachmentDownload)
+            to_fetch: List[_PartJob] = []
 
-            message_id = _get_message_id(msg)
-            attachment_index = 0
-
-            for filename, payload in _iter_attachments(msg):
-                # aplicar regex ao nome do ficheiro, se definido
-                if rule.filename_regex:
-                    if not re.search(rule.filename_regex, filename):
-                        log.debug(
-                            "Anexo '%s' não corresponde ao padrão '%s', a ignorar.",
-                            filename,
-                            rule.filename_regex,
-                        )
-                        continue
+            for uid in batch:
+                uid_str = str(uid)
+                data = fetch_data.get(uid)
+                if data is None:
+                    if debug_on:
+                        log.debug("UID %s já não existe na pasta, a ignorar.", uid_str)
+                    continue
 
-                attachment_index += 1
+                stats.emails_processed += 1
 
-                final_path = build_download_filename(
-                    msg=msg,
-                    attachment_name=filename,
-                    rule=rule,
-                    index=attachment_index,
-                    dest_folder=dest_folder,
+                # só os cabeçalhos pedidos, sem analisar o corpo da mensagem
+                headers = _header_parser.parsebytes(
+                    _find_fetch_item(data, b"BODY[HEADER") or b""
                 )
+                msg_date = _get_message_datetime(headers) or data.get(b"INTERNALDATE")
+                message_id = _get_message_id(headers).strip()
+                sender = _decode_header_value(headers.get("From"))
+                subject = _decode_header_value(headers.get("Subject"))
 
                 try:
-                    with final_path.open("wb") as f:
-                        f.write(payload)
+                    parts = list(_iter_attachment_parts(data[b"BODYSTRUCTURE"]))
                 except Exception as e:
-                    err = f"Erro ao gravar anexo '{final_path}': {e}"
+                    log.warning(
+                        "BODYSTRUCTURE inválido no UID %s (%s); a descarregar mensagem completa.",
+                        uid_str,
+                        e,
+                    )
+                    try:
+                        parts = _fetch_rfc822_attachments(client, uid)
+                    except Exception as e:
+                        err = f"Erro ao buscar mensagem UID {uid}: {e}"
+                        log.error(err)
+                        stats.errors.append(err)
+                        continue
+
+                attachment_index = 0
+
+                for part in parts:
+                    filename = part.filename
+
+                    # aplicar regex ao nome do ficheiro, se definido
+                    if filename_match is not None:
+                        if not filename_match(filename):
+                            if debug_on:
+                                log.debug(
+                                    "Anexo '%s' não corresponde ao padrão '%s', a ignorar.",
+                                    filename,
+                                    rule.filename_regex,
+                                )
+                            continue
+
+                    attachment_index += 1
+
+                    final_path = build_download_filename(
+                        msg=headers,
+                        attachment_name=filename,
+                        rule=rule,
+                        index=attachment_index,
+                        dest_folder=dest_folder,
+                        msg_date=msg_date,
+                        existing=existing_names,
+                        template=template,
+                    )
+
+                    to_fetch.append((
+                        uid,
+                        part,
+                        AttachmentDownload(
+                            rule_name=rule.name,
+                            account_name=account_cfg.name or account_cfg.username,
+                            folder=rule.imap_folder,
+                            uid=uid_str,
+                            message_id=message_id,
+                            original_filename=filename,
+                            final_path=final_path,
+                            size_bytes=0,
+                            sender=sender,
+                            subject=subject,
+                        ),
+                    ))
+
+                if attachment_index > 0:
+                    selected_uids.append(uid)
+
+            for (uid, part, download), payload, error in _fetch_parts(client, to_fetch):
+                if error is not None:
+                    err = f"Erro ao buscar anexo '{part.filename}' do UID {uid}: {error}"
                     log.error(err)
                     stats.errors.append(err)
+                    failed_uids.add(download.uid)
                     continue
 
-                size_bytes = len(payload)
-                stats.attachments_downloaded += 1
-                stats.downloaded_attachments.append(
-                    AttachmentDownload(
-                        rule_name=rule.name,
-                        account_name=account_cfg.name or account_cfg.username,
-                        folder=rule.imap_folder,
-                        uid=uid_str,
-                        message_id=message_id,
-                        original_filename=filename,
-                        final_path=final_path,
-                        size_bytes=size_bytes,
-                    )
-                )
-
-            # se algum anexo foi processado, marcamos o UID como processado
-            if attachment_index > 0:
-                stats.processed_uids.add(uid_str)
+                # não acumular demasiados anexos em memória à espera de disco
+                if len(in_flight) >= _MAX_PENDING_WRITES:
+                    _done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
 
-                # marcar como lido
-                if rule.mark_as_read:
-                    try:
-                        client.add_flags([uid], [b"\\Seen"])
-                    except Exception as e:
-                        log.warning(
-                            "Não foi possível marcar email UID %s como lido: %s",
-                            uid_str,
-                            e,
-                        )
-
-                # mover para outra pasta, se configurado
-                if rule.move_to_folder:
-                    try:
-                        client.move([uid], rule.move_to_folder)
-                    except Exception as e:
-                        log.warning(
-                            "Não foi possível mover email UID %s para '%s': %s",
-                            uid_str,
-                            rule.move_to_folder,
-                            e,
-                        )
+                future = write_pool.submit(
+                    _write_part_payload, payload, part.encoding, download.final_path
+                )
+                in_flight.add(future)
+                writes.append((future, download))
+
+        # todas as gravações têm de terminar antes de marcar/mover os emails
+        _collect_writes(writes, stats, failed_uids)
+        writes = []
+
+        # um UID só fica processado (e é marcado/movido) se todos os anexos
+        # seleccionados foram gravados; os restantes voltam a ser tentados
+        # na próxima execução
+        written_uids = {att.uid for att in stats.downloaded_attachments}
+        done_uids = [
+            uid for uid in selected_uids
+            if str(uid) in written_uids and str(uid) not in failed_uids
+        ]
+        stats.processed_uids.update(str(uid) for uid in done_uids)
+
+        # só avançar o ponto de partida se nada falhou nesta execução
+        # (com UIDNEXT - 1, para uma regra sem resultados não voltar a
+        # analisar a pasta inteira na próxima execução)
+        if not stats.errors and uid_validity is not None:
+            candidates = list(uids)
+            if uid_next:
+                candidates.append(uid_next - 1)
+            if min_uid is not None:
+                candidates.append(rule.last_uid)
+            stats.last_uid = max(candidates, default=None)
+
+        # marcar como lido e mover: um comando por lote de UIDs, não por email
+        # (as flags primeiro, porque depois do MOVE os UIDs deixam de existir aqui)
+        if rule.mark_as_read:
+            _run_batched(
+                client.add_flags,
+                done_uids,
+                "marcar como lido",
+                [b"\\Seen"],
+            )
+
+        if rule.move_to_folder:
+            _run_batched(
+                client.move,
+                done_uids,
+                f"mover para '{rule.move_to_folder}'",
+                rule.move_to_folder,
+            )
+
+        discard_client = False
 
     finally:
-        try:
-            client.logout()
-        except Exception:
-            pass
+        write_pool.shutdown(wait=True)
+        # execução interrompida por erro: registar o que chegou a ser gravado
+        # (sem marcar UIDs como processados)
+        _collect_writes(writes, stats, set())
+        release_client(account_cfg, client, discard=discard_client)
 
     log.info(
         "Regra '%s' concluída: %d emails processados, %d anexos descarregados.",
@@ -0,0 +1,181 @@
+"""
+Pool de ligações IMAP reutilizáveis do AttachFlow.
+
+Cada teste de ligação / execução de regra pagava TLS + LOGIN (centenas de ms).
+Aqui as ligações ficam guardadas por (host, port, username) e são
+reaproveitadas enquanto estiverem vivas:
+
+- get_client(cfg)      -> empresta um cliente (exclusivo) já autenticado
+- release_client(...)  -> devolve-o ao pool (ou fecha-o, se discard=True)
+
+Um temporizador em background envia NOOP às ligações paradas e fecha as que
+estão inactivas há mais de IDLE_TIMEOUT (os fornecedores costumam cortar
+ligações IMAP ao fim de ~30 minutos).
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from imapclient import IMAPClient
+
+if TYPE_CHECKING:
+    from .email_core import EmailAccountConfig
+
+
+log = logging.getLogger(__name__)
+
+# Fecha ligações paradas há mais de 25 minutos
+IDLE_TIMEOUT = 25 * 60
+
+# Intervalo entre NOOPs de keepalive às ligações guardadas
+KEEPALIVE_INTERVAL = 5 * 60
+
+PoolKey = Tuple[str, int, str]
+
+
+@dataclass
+class _PooledClient:
+    client: IMAPClient
+    password: str
+    last_used: float
+
+
+_pool: Dict[PoolKey, _PooledClient] = {}
+_lock = threading.Lock()
+_maintenance_timer: Optional[threading.Timer] = None
+
+
+def _pool_key(cfg: "EmailAccountConfig") -> PoolKey:
+    return (cfg.host, cfg.port, cfg.username)
+
+
+def _is_alive(client: IMAPClient) -> bool:
+    """
+    Verificação barata de que a ligação continua utilizável.
+    """
+    try:
+        client.noop()
+        return True
+    except (IMAPClient.AbortError, IMAPClient.Error, OSError):
+        return False
+
+
+def _logout(client: IMAPClient) -> None:
+    try:
+        client.logout()
+    except Exception:
+        pass
+
+
+def get_client(cfg: "EmailAccountConfig") -> IMAPClient:
+    """
+    Devolve um cliente IMAP ligado e autenticado para a conta indicada.
+    Reutiliza uma ligação do pool se ainda responder a NOOP; caso contrário
+    abre uma nova. O cliente fica em uso exclusivo até release_client().
+    """
+    key = _pool_key(cfg)
+    with _lock:
+        entry = _pool.pop(key, None)
+
+    if entry is not None:
+        idle = time.monotonic() - entry.last_used
+        if idle < IDLE_TIMEOUT and entry.password == cfg.password and _is_alive(entry.client):
+            log.debug("A reutilizar ligação IMAP %s@%s", cfg.username, cfg.host)
+            return entry.client
+        _logout(entry.client)
+
+    # import tardio: email_core importa este módulo
+    from .email_core import _connect_imap
+
+    return _connect_imap(cfg)
+
+
+def release_client(
+    cfg: "EmailAccountConfig",
+    client: IMAPClient,
+    discard: bool = False,
+) -> None:
+    """
+    Devolve um cliente ao pool. Com discard=True (ex.: após erro de rede)
+    a ligação é fechada em vez de guardada.
+    """
+    if discard:
+        _logout(client)
+        return
+
+    key = _pool_key(cfg)
+    with _lock:
+        if key not in _pool:
+            _pool[key] = _PooledClient(client, cfg.password, time.monotonic())
+            _schedule_maintenance()
+            return
+
+    # já existe outra ligação guardada para esta conta
+    _logout(client)
+
+
+def _schedule_maintenance() -> None:
+    """
+    Arranca o temporizador de keepalive/expiração (chamar com _lock adquirido).
+    """
+    global _maintenance_timer
+    if _maintenance_timer is not None:
+        return
+    _maintenance_timer = threading.Timer(KEEPALIVE_INTERVAL, _maintenance)
+    _maintenance_timer.daemon = True
+    _maintenance_timer.start()
+
+
+def _maintenance() -> None:
+    """
+    Fecha ligações inactivas há demasiado tempo e envia NOOP às restantes.
+    O trabalho de rede é feito fora do lock para não bloquear get_client().
+    """
+    global _maintenance_timer
+    with _lock:
+        _maintenance_timer = None
+        entries = list(_pool.items())
+        _pool.clear()
+
+    now = time.monotonic()
+    alive = []
+    for key, entry in entries:
+        if now - entry.last_used >= IDLE_TIMEOUT or not _is_alive(entry.client):
+            log.debug("A fechar ligação IMAP inactiva %s@%s", key[2], key[0])
+            _logout(entry.client)
+        else:
+            alive.append((key, entry))
+
+    with _lock:
+        for key, entry in alive:
+            if key in _pool:
+                _logout(entry.client)
+            else:
+                _pool[key] = entry
+        if _pool:
+            _schedule_maintenance()
+
+
+def close_all() -> None:
+    """
+    Fecha todas as ligações guardadas (chamado automaticamente à saída).
+    """
+    global _maintenance_timer
+    with _lock:
+        entries = list(_pool.values())
+        _pool.clear()
+        if _maintenance_timer is not None:
+            _maintenance_timer.cancel()
+            _maintenance_timer = None
+
+    for entry in entries:
+        _logout(entry.client)
+
+
+atexit.register(close_all)
@@ -0,0 +1,45 @@
+"""
+Configuração de logging do AttachFlow.
+
+Os módulos do núcleo só criam loggers (logging.getLogger(__name__)); os
+handlers são configurados uma vez, pelo ponto de entrada (manage.py / CLI),
+para não duplicar mensagens quando o Django ou outra aplicação já configurou
+o logging.
+
+As threads que processam emails só colocam os registos numa fila
+(QueueHandler); a formatação e a escrita na consola são feitas por uma
+thread própria (QueueListener), fora do caminho crítico.
+"""
+
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(level: int = logging.INFO) -> None:
+    """
+    Configura o logger raiz (consola, via fila). Não faz nada se já tiver
+    handlers.
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, console, respect_handler_level=True)
+    _listener.start()
+    # escrever o que ainda estiver na fila antes de o processo terminar
+    atexit.register(_listener.stop)
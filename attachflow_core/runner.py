@@ -0,0 +1,85 @@
+"""
+Execução concorrente de várias regras do AttachFlow.
+
+O tempo de uma regra é quase todo espera de rede (IMAP), por isso várias
+regras podem correr em paralelo. Cada regra usa o run_rule síncrono numa
+thread (asyncio.to_thread) e um Semaphore limita quantas ligações IMAP
+ficam activas ao mesmo tempo, para respeitar os limites dos fornecedores.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import List, Optional, Sequence, Set
+
+from .email_core import RuleConfig, RunStats, run_rule
+
+
+log = logging.getLogger(__name__)
+
+# Número máximo de regras (= ligações IMAP) em execução simultânea
+MAX_CONCURRENT_RULES = 4
+
+
+async def run_rule_async(
+    rule: RuleConfig,
+    processed_uids: Optional[Set[str]] = None,
+) -> RunStats:
+    """
+    Executa run_rule numa thread, sem bloquear o event loop.
+    """
+    return await asyncio.to_thread(run_rule, rule, processed_uids)
+
+
+async def run_rules_async(
+    rules: Sequence[RuleConfig],
+    processed_uids: Optional[Sequence[Optional[Set[str]]]] = None,
+    max_concurrency: int = MAX_CONCURRENT_RULES,
+) -> List[RunStats]:
+    """
+    Executa várias regras em paralelo (no máximo max_concurrency de cada vez).
+
+    processed_uids:
+      lista paralela a rules com os UIDs já processados de cada regra.
+
+    Devolve os RunStats pela mesma ordem de rules. Um erro inesperado numa
+    regra fica registado no respectivo RunStats.errors e não cancela as outras.
+    Levanta ValueError se max_concurrency for menor que 1.
+    """
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency tem de ser pelo menos 1 (recebido: {max_concurrency})")
+
+    if processed_uids is None:
+        processed_uids = [None] * len(rules)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def limited(rule: RuleConfig, uids: Optional[Set[str]]) -> RunStats:
+        async with semaphore:
+            try:
+                return await run_rule_async(rule, uids)
+            except Exception as e:
+                log.exception("Erro inesperado na regra '%s'", rule.name)
+                stats = RunStats()
+                stats.errors.append(f"Erro inesperado na regra '{rule.name}': {e}")
+                return stats
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(limited(rule, uids))
+            for rule, uids in zip(rules, processed_uids)
+        ]
+
+    return [task.result() for task in tasks]
+
+
+def run_rules(
+    rules: Sequence[RuleConfig],
+    processed_uids: Optional[Sequence[Optional[Set[str]]]] = None,
+    max_concurrency: int = MAX_CONCURRENT_RULES,
+) -> List[RunStats]:
+    """
+    Ponto de entrada síncrono (management commands, scheduler).
+    """
+    return asyncio.run(run_rules_async(rules, processed_uids, max_concurrency))
@@ -80,17 +80,17 @@ class EmailAccountAdmin(admin.ModelAdmin):
                 )
                 return HttpResponseRedirect(".")
 
-            # Actualizar estado na BD
-            obj.cached_folders = result.folders
-            obj.last_connection_ok = result.success
-            obj.last_connection_message = result.message
-            obj.save(
-                update_fields=[
-                    "cached_folders",
-                    "last_connection_ok",
-                    "last_connection_message",
-                ]
-            )
+            # Actualizar estado na BD (só os campos que mudaram desde o último teste)
+            new_state = {
+                "cached_folders": result.folders,
+                "last_connection_ok": result.success,
+                "last_connection_message": result.message,
+            }
+            changed = [name for name, value in new_state.items() if getattr(obj, name) != value]
+            if changed:
+                for name in changed:
+                    setattr(obj, name, new_state[name])
+                obj.save(update_fields=changed)
 
             # Mensagens amigáveis
             if result.success:
@@ -16,6 +16,10 @@ def main():
     root_dir_str = str(root_dir)
     if root_dir_str not in sys.path:
         sys.path.insert(0, root_dir_str)
+
+    # logging do núcleo (attachflow_core) na consola
+    from attachflow_core.logging_config import setup_logging
+    setup_logging()
     
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'attachflow_web.settings')
     try:
@@ -14,12 +14,14 @@ class RuleAdmin(admin.ModelAdmin):
         'created_at',
     )
     list_filter = ('enabled', 'account', 'imap_folder')
-    search_fields = ('name', 'from_contains', 'subject_contains', 'dest_folder')
+    list_select_related = ('account',)
+    search_fields = ('name', 'from_contains', 'subject_contains', 'body_contains', 'dest_folder')
 
 @admin.register(ProcessedEmail)
 class ProcessedEmailAdmin(admin.ModelAdmin):
     list_display = ('account', 'rule', 'folder', 'uid', 'processed_at')
     list_filter = ('account', 'rule', 'folder')
+    list_select_related = ('account', 'rule__account')
     search_fields = ('uid', 'message_id_header')
 
 
@@ -34,6 +36,7 @@ class JobExecutionAdmin(admin.ModelAdmin):
         'finished_at',
     )
     list_filter = ('status', 'rule')
+    list_select_related = ('rule__account',)
     search_fields = ('rule__name', 'error_message')
 
 
@@ -48,4 +51,5 @@ class AttachmentLogAdmin(admin.ModelAdmin):
         'downloaded_at',
     )
     list_filter = ('rule', 'account', 'folder')
+    list_select_related = ('execution__rule', 'rule__account', 'account')
     search_fields = ('file_name', 'original_filename', 'sender', 'subject', 'message_id')
\ No newline at end of file
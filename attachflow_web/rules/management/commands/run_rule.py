@@ -1,69 +1,100 @@
 from django.core.management.base import BaseCommand, CommandError
 from rules.models import Rule
-from accounts.models import EmailAccount
+from rules.services import (
+    RULE_RUN_FIELDS,
+    build_rule_config,
+    finish_execution,
+    load_processed_uids,
+    start_execution,
+)
 
 # Importar núcleo
-from attachflow_core.email_core import (
-    EmailAccountConfig,
-    RuleConfig,
-    run_rule
-)
+from attachflow_core.email_core import RunStats
+from attachflow_core.runner import MAX_CONCURRENT_RULES, run_rules
 
 class Command(BaseCommand):
-    help = "Executa uma regra específica do AttachFlow (por ID)."
-    
+    help = "Executa uma ou mais regras do AttachFlow (por ID), em paralelo."
+
     def add_arguments(self, parser):
-        parser.add_argument("rule_id", type=int, help="ID da regra (Rule.id)")
-        
+        parser.add_argument("rule_ids", nargs="+", type=int, help="ID(s) da regra (Rule.id)")
+        parser.add_argument(
+            "--max-concurrency",
+            type=int,
+            default=MAX_CONCURRENT_RULES,
+            help="Número máximo de regras executadas em simultâneo.",
+        )
+
     def handle(self, *args, **options):
-        rule_id = options["rule_id"]
-        
-        try:
-            rule = Rule.objects.select_related("account").get(id=rule_id)
-        except Rule.DoesNotExist:
-            raise CommandError(f"Regra com ID {rule_id} não encontrada.")
-        
-        account = rule.account
-        
-        # Construir EmailAccountConfig (núcleo)
-        account_cfg = EmailAccountConfig(
-            host=account.host,
-            port=account.port,
-            username=account.username,
-            password=account.password,
-            use_ssl=account.use_ssl,
-            folder=account.folder,
-            name=account.name,
+        rule_ids = list(dict.fromkeys(options["rule_ids"]))
+
+        # validar antes de criar JobExecutions (ficariam em RUNNING)
+        if options["max_concurrency"] < 1:
+            raise CommandError("--max-concurrency tem de ser pelo menos 1.")
+
+        rules_by_id = (
+            Rule.objects
+            .select_related("account")
+            .only(*RULE_RUN_FIELDS)
+            .in_bulk(rule_ids)
         )
-        
-        # Construir RuleConfig (núcleo)
-        rule_cfg = RuleConfig(
-            account=account_cfg,
-            name=rule.name,
-            imap_folder=rule.imap_folder,
-            from_contains=rule.from_contains,
-            subject_contains=rule.subject_contains,
-            filename_regex=rule.filename_regex,
-            dest_folder=rule.dest_folder,
-            mark_as_read=rule.mark_as_read,
-            move_to_folder=rule.move_to_folder,
-            filename_template=rule.filename_template,
+        missing = [str(rule_id) for rule_id in rule_ids if rule_id not in rules_by_id]
+        if missing:
+            raise CommandError(f"Regra(s) com ID {', '.join(missing)} não encontrada(s).")
+
+        # Construir RuleConfig (núcleo); filename_regex é validado aqui.
+        # Uma regra com configuração inválida fica com a execução em ERROR
+        # e não impede as restantes de correr.
+        rules = []
+        rule_cfgs = []
+        for rule_id in rule_ids:
+            rule = rules_by_id[rule_id]
+            try:
+                rule_cfgs.append(build_rule_config(rule))
+            except ValueError as e:
+                stats = RunStats()
+                stats.errors.append(f"Regra '{rule.name}' (ID {rule.id}): {e}")
+                finish_execution(start_execution(rule), stats)
+                self._report(rule, stats)
+                continue
+            rules.append(rule)
+
+        if not rules:
+            raise CommandError("Nenhuma regra com configuração válida para executar.")
+
+        processed = [load_processed_uids(rule) for rule in rules]
+        executions = [start_execution(rule) for rule in rules]
+
+        for rule in rules:
+            self.stdout.write(self.style.NOTICE(f"▶ A executar regra: {rule.name}"))
+
+        # Executar núcleo (várias regras correm em paralelo). Também com uma
+        # só regra: run_rules regista um erro inesperado no RunStats, para a
+        # execução não ficar em RUNNING.
+        results = run_rules(
+            rule_cfgs,
+            processed,
+            max_concurrency=options["max_concurrency"],
         )
-        
-        self.stdout.write(self.style.NOTICE(f"▶ A executar regra: {rule.name}"))
-        
-        # Executar núcleo
-        stats = run_rule(rule_cfg)
-        
+
+        for rule, execution, stats in zip(rules, executions, results):
+            # Gravar execução, anexos e UIDs processados
+            finish_execution(execution, stats)
+            self._report(rule, stats)
+
+    def _report(self, rule, stats):
         # Mostrar resultados (MVP)
         self.stdout.write(self.style.SUCCESS(
-            f"✔ Execução concluída.\n"
+            f"✔ Execução concluída: {rule.name}\n"
             f"Emails processados: {stats.emails_processed}\n"
             f"Anexos descarregados: {stats.attachments_downloaded}\n"
         ))
-        
+
+        if stats.uid_validity_reset:
+            self.stdout.write(self.style.WARNING(
+                "⚠ O UIDVALIDITY da pasta mudou: UIDs processados anteriores descartados."
+            ))
+
         if stats.errors:
             self.stdout.write(self.style.WARNING("⚠ Erros encontrados:"))
             for err in stats.errors:
                 self.stdout.write(f" - {err}")
-                
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-15 03:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0002_rule_filename_template_jobexecution_attachmentlog_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rule',
+            name='body_contains',
+            field=models.CharField(blank=True, help_text='Filtro pelo corpo do email (contém), aplicado pelo servidor IMAP.', max_length=255),
+        ),
+    ]
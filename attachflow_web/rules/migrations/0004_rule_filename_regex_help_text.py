@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-15 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0003_rule_body_contains'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rule',
+            name='filename_regex',
+            field=models.CharField(blank=True, help_text='Expressão regular para o nome COMPLETO do ficheiro do anexo. Ex.: Fatura_.*\\.pdf (no máximo um .* ou .+ por alternativa)', max_length=255),
+        ),
+    ]
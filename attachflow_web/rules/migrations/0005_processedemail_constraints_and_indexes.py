@@ -0,0 +1,26 @@
+# Generated by Django 5.1.2 on 2026-10-15 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_emailaccount_cached_folders_and_more'),
+        ('rules', '0004_rule_filename_regex_help_text'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='processedemail',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='processedemail',
+            index=models.Index(fields=['rule', 'folder', 'uid'], name='processed_rule_folder_uid'),
+        ),
+        migrations.AddConstraint(
+            model_name='processedemail',
+            constraint=models.UniqueConstraint(fields=('account', 'folder', 'uid', 'rule'), name='uniq_processed_email'),
+        ),
+    ]
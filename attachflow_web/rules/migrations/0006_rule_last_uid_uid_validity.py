@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-15 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0005_processedemail_constraints_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rule',
+            name='last_uid',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='rule',
+            name='uid_validity',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
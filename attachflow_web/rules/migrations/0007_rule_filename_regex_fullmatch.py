@@ -0,0 +1,138 @@
+"""
+Converte os filename_regex gravados para a nova semântica (fullmatch).
+
+Até à 0004 o padrão era procurado em qualquer posição do nome (re.search):
+"\\.pdf$" correspondia a "fatura.pdf", mas com fullmatch já não corresponde
+a nada. Cada padrão é envolvido de forma a manter o significado antigo:
+- "^..." / "\\A..." / ".*..."   ->  "(?:...).{0,255}"
+- "...$" / "...\\Z" / "....*"   ->  ".*(?:...)"
+- sem âncoras                  ->  ".*(?:...).{0,255}"
+Flags inline no início ("(?i)") passam para a frente do padrão envolvido, e
+o segundo ".*"/".+" de uma alternativa passa a ".{0,255}"/".{1,255}"
+(compile_filename_regex só aceita um curinga ilimitado por alternativa).
+Com "|" o padrão é tratado como não ancorado.
+
+O resultado é validado com as mesmas regras de compile_filename_regex; se
+falhar (ou não couber no campo), o padrão fica como está e o id da regra é
+registado no log.
+"""
+
+import logging
+import re
+
+from django.db import migrations
+
+log = logging.getLogger(__name__)
+
+# ver attachflow_core.email_core (copiados para a migração não depender do núcleo)
+_UNBOUNDED_WILDCARD_RE = re.compile(r"(?<!\\)\.[*+]")
+_ALTERNATION_RE = re.compile(r"(?<!\\)\|")
+
+# flags inline globais, que o Python só aceita no início do padrão
+_INLINE_FLAGS_RE = re.compile(r"(?:\(\?[aiLmsux]+\))+")
+
+# curinga limitado (nomes de ficheiro têm no máximo 255 caracteres)
+_BOUNDED_WILDCARD = ".{0,255}"
+_BOUNDED = {".*": ".{0,255}", ".+": ".{1,255}"}
+
+FILENAME_REGEX_MAX_LENGTH = 255
+
+
+def _ends_with(pattern, suffix):
+    # suffix não escapado (número par de "\" antes)
+    if not pattern.endswith(suffix):
+        return False
+    head = pattern[: -len(suffix)]
+    return (len(head) - len(head.rstrip("\\"))) % 2 == 0
+
+
+def _is_valid(pattern):
+    """
+    As mesmas regras de compile_filename_regex: no máximo um ".*"/".+" por
+    alternativa e expressão compilável.
+    """
+    for branch in _ALTERNATION_RE.split(pattern):
+        if len(_UNBOUNDED_WILDCARD_RE.findall(branch)) > 1:
+            return False
+    try:
+        re.compile(pattern)
+    except re.error:
+        return False
+    return True
+
+
+def _bound_extra_wildcards(pattern):
+    """
+    Em cada alternativa mantém o primeiro ".*"/".+" e limita os seguintes.
+    """
+    branches = []
+    for branch in _ALTERNATION_RE.split(pattern):
+        matches = list(_UNBOUNDED_WILDCARD_RE.finditer(branch))
+        for m in reversed(matches[1:]):
+            branch = branch[: m.start()] + _BOUNDED[m.group()] + branch[m.end():]
+        branches.append(branch)
+    return "|".join(branches)
+
+
+def _search_to_fullmatch(pattern):
+    """
+    Padrão equivalente com fullmatch ao antigo re.search(pattern), ou None
+    se não for possível obter um padrão válido.
+    """
+    try:
+        re.compile(pattern)
+    except re.error:
+        return None
+
+    flags_match = _INLINE_FLAGS_RE.match(pattern)
+    flags = flags_match.group() if flags_match else ""
+    body = _bound_extra_wildcards(pattern[len(flags):])
+
+    # com "|" a âncora pode valer só para uma das alternativas
+    alternation = _ALTERNATION_RE.search(body) is not None
+    open_start = alternation or not body.startswith(("^", "\\A", ".*", ".+"))
+    open_end = alternation or not any(
+        _ends_with(body, suffix) for suffix in ("$", "\\Z", ".*", ".+", ".*?", ".+?")
+    )
+
+    prefix = suffix = ""
+    if open_start:
+        first_branch = _ALTERNATION_RE.split(body)[0]
+        has_wildcard = _UNBOUNDED_WILDCARD_RE.search(first_branch) is not None
+        prefix = _BOUNDED_WILDCARD if has_wildcard else ".*"
+    if open_end:
+        suffix = _BOUNDED_WILDCARD
+
+    if prefix or suffix:
+        converted = f"{flags}{prefix}(?:{body}){suffix}"
+    else:
+        converted = f"{flags}{body}"
+
+    return converted if _is_valid(converted) else None
+
+
+def convert_filename_regex(apps, schema_editor):
+    Rule = apps.get_model("rules", "Rule")
+    for rule in Rule.objects.exclude(filename_regex="").only("id", "filename_regex"):
+        converted = _search_to_fullmatch(rule.filename_regex)
+        if converted is None or len(converted) > FILENAME_REGEX_MAX_LENGTH:
+            log.warning(
+                "Regra %s: filename_regex %r não convertido para fullmatch; rever à mão.",
+                rule.pk,
+                rule.filename_regex,
+            )
+            continue
+        if converted != rule.filename_regex:
+            # update() e não save(): não reiniciar a pesquisa incremental
+            Rule.objects.filter(pk=rule.pk).update(filename_regex=converted)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0006_rule_last_uid_uid_validity'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_filename_regex, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,11 @@
+from functools import cached_property
+
+from django.core.exceptions import ValidationError
 from django.db import models
 from accounts.models import EmailAccount
 
+from attachflow_core.email_core import compile_filename_regex
+
 class Rule(models.Model):
     """
     Regra de captura de anexos para uma conta de email específica.
@@ -43,10 +48,19 @@ class Rule(models.Model):
         help_text="Filtro por assunto (contém). Ex.: 'Fatura' ou 'Factura'"
     )
 
+    body_contains = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="Filtro pelo corpo do email (contém), aplicado pelo servidor IMAP."
+    )
+
     filename_regex = models.CharField(
         max_length=255,
         blank=True,
-        help_text="Expressão regular para o nome de ficheiro do anexo. Ex.: ^Fatura_.*\\.pdf$"
+        help_text=(
+            "Expressão regular para o nome COMPLETO do ficheiro do anexo. "
+            "Ex.: Fatura_.*\\.pdf (no máximo um .* ou .+ por alternativa)"
+        )
     )
 
     filename_template = models.CharField(
@@ -77,6 +91,12 @@ class Rule(models.Model):
         help_text="Se preenchido, mover o email para esta pasta IMAP após processamento."
     )
     
+    # Pesquisa incremental: maior UID já analisado na imap_folder e o
+    # UIDVALIDITY da pasta nesse momento (actualizados em cada execução).
+    # uid_validity é também a numeração dos UIDs em ProcessedEmail.
+    last_uid = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    uid_validity = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -86,6 +106,53 @@ class Rule(models.Model):
 
     def __str__(self):
         return f"[{self.account.name}] {self.name}"
+
+    def clean(self):
+        """
+        Valida o filename_regex ao gravar (admin/formulários), com as mesmas
+        regras do núcleo: sintaxe válida e no máximo um .*/.+ por alternativa.
+        """
+        super().clean()
+        if self.filename_regex:
+            try:
+                compile_filename_regex(self.filename_regex)
+            except ValueError as e:
+                raise ValidationError({"filename_regex": str(e)})
+
+    @cached_property
+    def compiled_filename_regex(self):
+        """
+        filename_regex compilado uma vez por instância (função de
+        correspondência de compile_filename_regex), ou None se vazio.
+        Levanta ValueError se o padrão for inválido.
+        """
+        if not self.filename_regex:
+            return None
+        return compile_filename_regex(self.filename_regex)
+
+    def save(self, *args, **kwargs):
+        # o padrão pode ter mudado: voltar a compilar no próximo acesso
+        self.__dict__.pop("compiled_filename_regex", None)
+        # filtros ou pasta podem ter mudado: a próxima execução analisa a pasta
+        # toda. uid_validity fica: é por ele que se detecta que os UIDs de
+        # ProcessedEmail deixaram de valer (ver run_rule).
+        self.last_uid = None
+        super().save(*args, **kwargs)
+
+
+class SelectRelatedManager(models.Manager):
+    """
+    Manager que junta logo as FKs indicadas (select_related), para listagens
+    que mostram a regra/conta de cada linha não fazerem uma query por linha.
+    """
+
+    def __init__(self, *related):
+        super().__init__()
+        self.related = related
+
+    def get_queryset(self):
+        return super().get_queryset().select_related(*self.related)
+
     
 class ProcessedEmail(models.Model):
     """
@@ -123,10 +190,21 @@ class ProcessedEmail(models.Model):
 
     processed_at = models.DateTimeField(auto_now_add=True)
 
+    objects = SelectRelatedManager("account", "rule__account")
+
     class Meta:
         verbose_name = "Email Processado"
         verbose_name_plural = "Emails Processados"
-        unique_together = ('account', 'folder', 'uid', 'rule')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['account', 'folder', 'uid', 'rule'],
+                name='uniq_processed_email',
+            ),
+        ]
+        indexes = [
+            # UIDs já processados de uma regra numa pasta (load_processed_uids)
+            models.Index(fields=['rule', 'folder', 'uid'], name='processed_rule_folder_uid'),
+        ]
 
     def __str__(self):
         return f"{self.account} | {self.folder} | UID {self.uid} | Regra {self.rule_id}"
@@ -166,6 +244,8 @@ class JobExecution(models.Model):
         help_text="Mensagem de erro, se a execução terminar em erro."
     )
 
+    objects = SelectRelatedManager("rule__account")
+
     class Meta:
         verbose_name = "Execução de Regra"
         verbose_name_plural = "Execuções de Regras"
@@ -245,6 +325,8 @@ class AttachmentLog(models.Model):
 
     downloaded_at = models.DateTimeField(auto_now_add=True)
 
+    objects = SelectRelatedManager("execution__rule", "rule__account", "account")
+
     class Meta:
         verbose_name = "Anexo Descarregado"
         verbose_name_plural = "Anexos Descarregados"
@@ -0,0 +1,183 @@
+"""
+Ligação entre os modelos Django e o núcleo attachflow_core:
+- construir as configurações do núcleo a partir de Rule / EmailAccount
+- ler os UIDs já processados de cada regra
+- gravar o resultado de cada execução (JobExecution, AttachmentLog, ProcessedEmail)
+
+Usado pelo management command run_rule e, futuramente, pelo scheduler.
+"""
+
+from typing import Set
+
+from django.db import transaction
+from django.utils import timezone
+
+from attachflow_core.email_core import (
+    EmailAccountConfig,
+    RuleConfig,
+    RunStats,
+)
+
+from .models import AttachmentLog, JobExecution, ProcessedEmail, Rule
+
+# Linhas por INSERT nas gravações em bloco
+PERSIST_BATCH_SIZE = 500
+
+# Colunas de Rule / EmailAccount lidas por build_rule_config e pelo
+# management command; usar com select_related("account").only(*RULE_RUN_FIELDS)
+RULE_RUN_FIELDS = (
+    "id",
+    "name",
+    "imap_folder",
+    "from_contains",
+    "subject_contains",
+    "body_contains",
+    "filename_regex",
+    "filename_template",
+    "dest_folder",
+    "mark_as_read",
+    "move_to_folder",
+    "last_uid",
+    "uid_validity",
+    "account__id",
+    "account__name",
+    "account__host",
+    "account__port",
+    "account__username",
+    "account__password",
+    "account__use_ssl",
+    "account__folder",
+)
+
+
+def build_rule_config(rule: Rule) -> RuleConfig:
+    """
+    Constrói o RuleConfig (núcleo) de uma regra.
+    Levanta ValueError se o filename_regex da regra for inválido.
+    """
+    account = rule.account
+
+    account_cfg = EmailAccountConfig(
+        host=account.host,
+        port=account.port,
+        username=account.username,
+        password=account.password,
+        use_ssl=account.use_ssl,
+        folder=account.folder,
+        name=account.name,
+    )
+
+    return RuleConfig(
+        account=account_cfg,
+        name=rule.name,
+        imap_folder=rule.imap_folder,
+        from_contains=rule.from_contains,
+        subject_contains=rule.subject_contains,
+        body_contains=rule.body_contains,
+        filename_regex=rule.filename_regex,
+        filename_match=rule.compiled_filename_regex,
+        dest_folder=rule.dest_folder,
+        mark_as_read=rule.mark_as_read,
+        move_to_folder=rule.move_to_folder,
+        filename_template=rule.filename_template,
+        last_uid=rule.last_uid,
+        uid_validity=rule.uid_validity,
+    )
+
+
+def load_processed_uids(rule: Rule) -> Set[str]:
+    """
+    UIDs já processados por esta regra na sua pasta IMAP (uma só query,
+    resolvida só com o índice (rule, folder, uid)).
+    """
+    return set(
+        ProcessedEmail.objects.filter(
+            rule=rule,
+            folder=rule.imap_folder,
+        ).values_list("uid", flat=True)
+    )
+
+
+def start_execution(rule: Rule) -> JobExecution:
+    return JobExecution.objects.create(rule=rule)
+
+
+def finish_execution(execution: JobExecution, stats: RunStats) -> None:
+    """
+    Grava o resultado de uma execução numa única transacção:
+    anexos e emails processados em bloco (bulk_create) e o estado final.
+    """
+    rule = execution.rule
+
+    message_ids = {}
+    logs = []
+    for att in stats.downloaded_attachments:
+        message_ids.setdefault(att.uid, att.message_id)
+        logs.append(
+            AttachmentLog(
+                execution=execution,
+                rule=rule,
+                account_id=rule.account_id,
+                file_path=str(att.final_path)[:500],
+                file_name=att.final_path.name[:255],
+                original_filename=att.original_filename[:255],
+                size_bytes=att.size_bytes,
+                sender=att.sender[:255],
+                subject=att.subject[:500],
+                folder=att.folder,
+                uid=att.uid,
+                message_id=att.message_id[:255],
+            )
+        )
+
+    processed = [
+        ProcessedEmail(
+            account_id=rule.account_id,
+            rule=rule,
+            folder=rule.imap_folder,
+            uid=uid,
+            message_id_header=message_ids.get(uid, "")[:255],
+        )
+        for uid in stats.processed_uids
+    ]
+
+    execution.finished_at = timezone.now()
+    execution.status = "ERROR" if stats.errors else "SUCCESS"
+    execution.emails_processed = stats.emails_processed
+    execution.attachments_downloaded = stats.attachments_downloaded
+    execution.error_message = "\n".join(stats.errors)
+
+    with transaction.atomic():
+        if stats.uid_validity_reset:
+            # UIDs renumerados pelo servidor: os antigos já não identificam
+            # estes emails e ocupariam a restrição única dos novos
+            ProcessedEmail.objects.filter(rule=rule, folder=rule.imap_folder).delete()
+        AttachmentLog.objects.bulk_create(logs, batch_size=PERSIST_BATCH_SIZE)
+        # a restrição única (account, folder, uid, rule) trata dos duplicados
+        ProcessedEmail.objects.bulk_create(
+            processed,
+            batch_size=PERSIST_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        execution.save(
+            update_fields=[
+                "finished_at",
+                "status",
+                "emails_processed",
+                "attachments_downloaded",
+                "error_message",
+            ]
+        )
+        if stats.last_uid is not None:
+            # update() e não save(): save() recomeça a pesquisa incremental
+            Rule.objects.filter(pk=rule.pk).update(
+                last_uid=stats.last_uid,
+                uid_validity=stats.uid_validity,
+            )
+        elif stats.uid_validity_reset:
+            # execução com erros: sem ponto de partida, mas os UIDs gravados
+            # acima já são do novo UIDVALIDITY
+            Rule.objects.filter(pk=rule.pk).update(
+                last_uid=None,
+                uid_validity=stats.uid_validity,
+            )
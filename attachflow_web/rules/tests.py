@@ -1,3 +1,260 @@
-from django.test import TestCase
+import base64
+import importlib
+import io
+import os
+import re
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.test import SimpleTestCase, TestCase
+from imapclient.response_parser import parse_fetch_response
+
+from accounts.models import EmailAccount
+from attachflow_core import email_core
+from attachflow_core.email_core import (
+    EmailAccountConfig,
+    RuleConfig,
+    compile_filename_regex,
+)
+
+from .models import Rule
+
+migration_0007 = importlib.import_module("rules.migrations.0007_rule_filename_regex_fullmatch")
+
+
+class SearchToFullmatchTests(SimpleTestCase):
+    """
+    Migração 0007: filename_regex gravados com a semântica antiga (re.search).
+    """
+
+    NAMES = [
+        "fatura.pdf",
+        "fatura.pdfx",
+        "Fatura_2024.pdf",
+        "A Fatura 2024.pdf",
+        "FATURA 2.PDF",
+        "Fatura.pdf.bak",
+        "recibo.txt",
+    ]
+
+    def assertSameMatches(self, pattern):
+        converted = migration_0007._search_to_fullmatch(pattern)
+        self.assertIsNotNone(converted)
+        match = compile_filename_regex(converted)
+        for name in self.NAMES:
+            with self.subTest(pattern=pattern, name=name):
+                self.assertEqual(bool(re.search(pattern, name)), bool(match(name)))
+        return converted
+
+    def test_end_anchor(self):
+        self.assertEqual(self.assertSameMatches(r"\.pdf$"), r".*(?:\.pdf$)")
+
+    def test_start_anchor(self):
+        self.assertEqual(self.assertSameMatches(r"^Fatura"), r"(?:^Fatura).{0,255}")
+
+    def test_unanchored(self):
+        self.assertEqual(self.assertSameMatches("Fatura"), r".*(?:Fatura).{0,255}")
+
+    def test_fully_anchored_is_unchanged(self):
+        self.assertEqual(self.assertSameMatches(r"^Fatura.*\.pdf$"), r"^Fatura.*\.pdf$")
+
+    def test_alternation_is_treated_as_unanchored(self):
+        self.assertEqual(self.assertSameMatches(r"recibo|\.pdf$"), r".*(?:recibo|\.pdf$).{0,255}")
+
+    def test_inline_flags_stay_in_front(self):
+        self.assertEqual(self.assertSameMatches("(?i)fatura"), r"(?i).*(?:fatura).{0,255}")
+        self.assertEqual(
+            self.assertSameMatches(r"(?i)^fatura.*\.pdf$"),
+            r"(?i)^fatura.*\.pdf$",
+        )
+
+    def test_extra_wildcards_are_bounded(self):
+        self.assertEqual(
+            self.assertSameMatches(r".*Fatura.*\.pdf"),
+            r"(?:.*Fatura.{0,255}\.pdf).{0,255}",
+        )
+        self.assertEqual(
+            self.assertSameMatches(r"Fatura.+\.pdf"),
+            r".{0,255}(?:Fatura.+\.pdf).{0,255}",
+        )
+
+    def test_invalid_pattern_is_not_converted(self):
+        self.assertIsNone(migration_0007._search_to_fullmatch("["))
+
+
+class ConvertFilenameRegexTests(TestCase):
+    def setUp(self):
+        self.account = EmailAccount.objects.create(name="Conta", username="u", password="p")
+
+    def make_rule(self, name, filename_regex):
+        return Rule.objects.create(
+            account=self.account,
+            name=name,
+            dest_folder="/tmp",
+            filename_regex=filename_regex,
+        )
+
+    def test_converts_valid_and_keeps_invalid(self):
+        flags = self.make_rule("flags", "(?i)fatura")
+        invalid = self.make_rule("invalid", "[")
+        empty = self.make_rule("empty", "")
+
+        with self.assertLogs(migration_0007.log, "WARNING") as logs:
+            migration_0007.convert_filename_regex(apps, None)
+
+        for rule in (flags, invalid, empty):
+            rule.refresh_from_db()
+        self.assertEqual(flags.filename_regex, r"(?i).*(?:fatura).{0,255}")
+        self.assertEqual(invalid.filename_regex, "[")
+        self.assertEqual(empty.filename_regex, "")
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(f"Regra {invalid.pk}", logs.output[0])
+
+        # a regra convertida volta a poder ser executada
+        self.assertTrue(flags.compiled_filename_regex("FATURA_1.pdf"))
+
+
+# ------------------------------------------------------------------------------
+# Núcleo (attachflow_core.email_core): funções puras usadas por run_rule
+# ------------------------------------------------------------------------------
+
+TEXT_PART = b'("text" "plain" ("charset" "utf-8") NIL NIL "7bit" 10 1 NIL NIL NIL NIL)'
+
+
+def pdf_part(name):
+    return (
+        b'("application" "pdf" ("name" "' + name + b'") NIL NIL "base64" 100 NIL '
+        b'("attachment" ("filename" "' + name + b'")) NIL NIL)'
+    )
+
+
+def message_part(inner):
+    envelope = b'("Mon, 1 Jan 2024 00:00:00 +0000" "Fwd" NIL NIL NIL NIL NIL NIL NIL "<m@x>")'
+    return (
+        b'("message" "rfc822" NIL NIL NIL "7bit" 500 ' + envelope + b" " + inner
+        + b' 20 NIL ("attachment" ("filename" "fwd.eml")) NIL NIL)'
+    )
+
+
+def parse_bodystructure(structure):
+    """BODYSTRUCTURE tal como o IMAPClient o devolve a run_rule."""
+    response = parse_fetch_response([b"1 (UID 5 BODYSTRUCTURE " + structure + b")"])
+    return response[5][b"BODYSTRUCTURE"]
+
+
+class AttachmentPartsTests(SimpleTestCase):
+    def parts(self, structure):
+        body = parse_bodystructure(structure)
+        return [(p.part_number, p.filename) for p in email_core._iter_attachment_parts(body)]
+
+    def test_nested_multipart_message(self):
+        inner = b"(" + TEXT_PART + pdf_part(b"b.pdf") + b' "mixed" ("boundary" "y") NIL NIL)'
+        structure = (
+            b"(" + TEXT_PART + pdf_part(b"a.pdf") + message_part(inner)
+            + b' "mixed" ("boundary" "x") NIL NIL)'
+        )
+        self.assertEqual(
+            self.parts(structure),
+            [("2", "a.pdf"), ("3", "fwd.eml"), ("3.2", "b.pdf")],
+        )
+
+    def test_nested_single_part_message(self):
+        structure = (
+            b"(" + TEXT_PART + message_part(pdf_part(b"b.pdf"))
+            + b' "mixed" ("boundary" "x") NIL NIL)'
+        )
+        self.assertEqual(self.parts(structure), [("2", "fwd.eml"), ("2.1", "b.pdf")])
+
+    def test_single_part_message(self):
+        self.assertEqual(self.parts(pdf_part(b"a.pdf")), [("1", "a.pdf")])
+
+
+class StructureDispositionTests(SimpleTestCase):
+    """Posição do Content-Disposition por tipo MIME (RFC 3501, 7.4.2)."""
+
+    DISPOSITION = (b"attachment", (b"filename", b"a.pdf"))
+
+    def test_text_part(self):
+        body = (b"text", b"plain", (), None, None, b"7bit", 10, 1, None, self.DISPOSITION)
+        self.assertEqual(
+            email_core._structure_disposition(body),
+            ("attachment", (b"filename", b"a.pdf")),
+        )
+
+    def test_message_part(self):
+        body = (b"message", b"rfc822", (), None, None, b"7bit", 500, (), (), 20, None, self.DISPOSITION)
+        self.assertEqual(email_core._structure_disposition(body)[0], "attachment")
+
+    def test_other_part(self):
+        body = (b"application", b"pdf", (), None, None, b"base64", 100, None, self.DISPOSITION)
+        self.assertEqual(email_core._structure_disposition(body)[0], "attachment")
+
+    def test_without_extension_fields(self):
+        body = (b"application", b"pdf", (), None, None, b"base64", 100)
+        self.assertEqual(email_core._structure_disposition(body), ("", ()))
+
+    def test_rfc2231_filename(self):
+        params = (b"filename*0*", b"utf-8''fatura%20", b"filename*1*", b"%C3%A9.pdf")
+        self.assertEqual(email_core._get_structure_param(params, "filename"), "fatura é.pdf")
+
+
+class CopyBase64Tests(SimpleTestCase):
+    def decode(self, data):
+        out = io.BytesIO()
+        email_core._copy_base64(data, out)
+        return out.getvalue()
+
+    def test_padded(self):
+        self.assertEqual(self.decode(b"QUJDRA=="), b"ABCD")
+
+    def test_unpadded(self):
+        self.assertEqual(self.decode(b"QUJDRA"), b"ABCD")
+        self.assertEqual(self.decode(b"QUJDRA="), b"ABCD")
+
+    def test_stray_last_character(self):
+        self.assertEqual(self.decode(b"QUJDR"), b"ABC")
+
+    def test_noise_is_ignored(self):
+        self.assertEqual(self.decode(b"QU\r\nJD\x00R A*==\r\n"), b"ABCD")
+
+    def test_unpadded_across_blocks(self):
+        payload = os.urandom(10_001)
+        encoded = base64.encodebytes(payload).rstrip(b"=\n")
+        with mock.patch.object(email_core, "_DECODE_CHUNK", 1000):
+            self.assertEqual(self.decode(encoded), payload)
+
+
+class SearchCriteriaTests(SimpleTestCase):
+    def setUp(self):
+        account = EmailAccountConfig(host="imap.example.com", port=993, username="u", password="p")
+        self.rule = RuleConfig(account=account, name="R")
+
+    def test_uid_ranges(self):
+        self.assertEqual(
+            email_core._uid_ranges({"7", "1", "2", "3", "x", "9", "10"}),
+            ["1:3", "7", "9:10"],
+        )
+
+    def test_without_filters(self):
+        self.assertEqual(email_core._build_search_criteria(self.rule), ["ALL"])
+
+    def test_filters_and_processed_uids(self):
+        self.rule.from_contains = "faturas@example.com"
+        self.assertEqual(
+            email_core._build_search_criteria(self.rule, {"1", "2", "3", "7"}),
+            ["FROM", "faturas@example.com", "NOT", "UID", "1:3,7"],
+        )
+
+    def test_min_uid(self):
+        self.assertEqual(
+            email_core._build_search_criteria(self.rule, {"1", "2", "5", "6", "9"}, min_uid=5),
+            ["UID", "5:*", "NOT", "UID", "5:6,9"],
+        )
+
+    def test_not_uid_keeps_most_recent_ranges(self):
+        processed = {str(uid) for uid in range(1, 6000, 2)}
+        criteria = email_core._build_search_criteria(self.rule, processed)
+        ranges = criteria[-1].split(",")
+        self.assertEqual(criteria[:2], ["NOT", "UID"])
+        self.assertEqual(len(ranges), email_core._MAX_NOT_UID_RANGES)
+        self.assertEqual(ranges[-1], "5999")